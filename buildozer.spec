@@ -5,7 +5,7 @@ package.domain = org.esp32
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,pem
 source.exclude_exts = spec
-source.exclude_dirs = venv,__pycache__,build
+source.exclude_dirs = venv,__pycache__,build,tests
 version = 0.0.1
 orientation = portrait
 
@@ -14,7 +14,7 @@ android.aab = False
 # 核心：指定Python版本匹配workflow
 android.blacklist_libs = libpython3.9.so
 # 核心：补充关键依赖
-requirements = python3,kivy==2.2.1,kivymd==1.2.0,paho-mqtt,pyjnius,setuptools
+requirements = python3,kivy==2.2.1,kivymd==1.2.0,paho-mqtt,pyjnius,setuptools,numpy
 
 entrypoint = main.py
 android.arch = arm64-v8a,armeabi-v7a
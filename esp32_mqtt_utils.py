@@ -1,22 +1,62 @@
 # esp32_mqtt_utils.py：纯净版MQTT工具类，带全量异常日志
 import paho.mqtt.client as mqtt
+import json
 import ssl
 import time
 from kivy.clock import Clock
 
+# 上报速率控制：App下发模式，设备按模式调整采样间隔和批量条数后回ACK
+# batch>1时设备攒够batch个样本一次上报到esp32/data，每个样本带采样时间戳（秒）：
+#   {"device_id": "...", "batch": [{"ts": 1760000000, "do": 7.1, "ph": 7.0, "temp": 25.3}, ...]}
+RATE_CONTROL_TOPIC = "esp32/rate"
+RATE_ACK_TOPIC = "esp32/rate/ack"
+RATE_MODES = {
+    "high": {"interval_ms": 1000, "batch": 1},    # 前台查看实时读数
+    "low": {"interval_ms": 60000, "batch": 10},   # 后台/非实时页面，批量上报
+    "burst": {"interval_ms": 200, "batch": 1},    # 告警期间
+}
+# 指令下发后等待ACK的时长（秒）及超时重发次数
+RATE_ACK_TIMEOUT = 10
+RATE_MAX_RETRIES = 3
+
+
+def report_interval_seconds(mode):
+    """某上报模式下设备两条上报消息之间的间隔（秒）：采样间隔 × 批量条数"""
+    config = RATE_MODES.get(mode)
+    return config["interval_ms"] * config["batch"] / 1000 if config else 0
+
 class Esp32MqttClient:
-    def __init__(self, broker, port, username, password, data_callback=None, max_reconnect_attempts=5):
+    def __init__(self, broker, port, username, password, data_callback=None, max_reconnect_attempts=5,
+                 message_callback=None):
         self.broker = broker
         self.port = port
         self.username = username
         self.password = password
         self.data_callback = data_callback  # 日志回调
+        self.message_callback = message_callback  # 消息回调（主线程调用，参数：topic, payload）
         
         self.mqtt_client = None
         self.connected = False
         self.reconnect_count = 0
         self.max_reconnect_attempts = max_reconnect_attempts
 
+        # 上报速率协商状态
+        self.rate_mode_requested = None
+        self.rate_mode_acked = None
+        self.rate_seq = 0
+        self.rate_seq_acked = None
+        self.rate_retry_count = 0
+        self.rate_ack_timer = None
+        self.rate_mode_since = time.time()
+        self.metrics = {
+            "rx_messages": 0,
+            "rx_bytes": 0,
+            "rate_changes": 0,
+            "rate_acks": 0,
+            "rx_bytes_by_mode": {},    # 各模式下收到的字节数（按已确认模式归类）
+            "seconds_by_mode": {},     # 各模式持续时长
+        }
+
     def init_mqtt_client(self):
         """初始化MQTT客户端（带异常捕获）"""
         try:
@@ -74,6 +114,11 @@ class Esp32MqttClient:
             self._log_msg(f"✅ MQTT连接成功：{rc_msg.get(rc, f'未知结果码{rc}')}")
             self.mqtt_client.subscribe("esp32/data")
             self.mqtt_client.subscribe("esp32/status")
+            # 影子状态为Broker保留消息，订阅后立即下发，用于与本地缓存对齐
+            self.mqtt_client.subscribe("esp32/shadow")
+            self.mqtt_client.subscribe(RATE_ACK_TOPIC)
+            # 设备可能已重启，重连后重新下发当前期望的上报模式（速率协商状态只在主线程读写）
+            Clock.schedule_once(lambda dt: self._resend_rate_mode(), 0)
         else:
             self.connected = False
             self._log_msg(f"❌ MQTT连接失败[结果码{rc}]：{rc_msg.get(rc, f'未知结果码{rc}')}")
@@ -91,10 +136,19 @@ class Esp32MqttClient:
     def _on_message(self, client, userdata, msg):
         """消息接收回调"""
         try:
+            # 本回调运行在paho网络线程，流量统计和ACK处理转到主线程，与set_rate_mode/get_metrics串行
+            size = len(msg.payload)
+            Clock.schedule_once(lambda dt: self._count_rx_bytes(size), 0)
             payload = msg.payload.decode('utf-8')
+            if msg.topic == RATE_ACK_TOPIC:
+                Clock.schedule_once(lambda dt: self._on_rate_ack(payload), 0)
+                return
             self._log_msg(f"📥 收到[{msg.topic}]：{payload}")
             if self.data_callback:
                 Clock.schedule_once(lambda dt: self.data_callback(f"📥 {msg.topic}: {payload}"), 0)
+            if self.message_callback:
+                topic = msg.topic
+                Clock.schedule_once(lambda dt: self.message_callback(topic, payload), 0)
         except Exception as e:
             self._log_msg(f"❌ 解析消息失败[{type(e).__name__}]：{str(e)}")
 
@@ -117,6 +171,115 @@ class Esp32MqttClient:
             self._log_msg(f"❌ 发布失败[{type(e).__name__}]：{str(e)}（{topic}：{payload}）")
             return False
 
+    def set_rate_mode(self, mode):
+        """设置期望的上报模式（high/low/burst），未连接时在连接成功后下发"""
+        if mode not in RATE_MODES:
+            self._log_msg(f"❌ 未知的上报模式：{mode}")
+            return False
+        # 只有设备已确认最新一次请求且模式相同时才跳过
+        if mode == self.rate_mode_acked and mode == self.rate_mode_requested \
+                and self.rate_seq_acked == self.rate_seq:
+            return True
+        if mode != self.rate_mode_requested:
+            self.rate_retry_count = 0
+        self.rate_mode_requested = mode
+        if not self.connected:
+            return False
+        return self._send_rate_mode(mode)
+
+    def _send_rate_mode(self, mode):
+        """下发速率控制指令（不等待发布完成，避免阻塞on_pause等生命周期回调）
+
+        指令为保留消息：设备重启或重连后订阅即可拿到最新模式；超时未收到ACK则重发。
+        """
+        self.rate_seq += 1
+        seq = self.rate_seq
+        if self.rate_ack_timer:
+            self.rate_ack_timer.cancel()
+        self.rate_ack_timer = Clock.schedule_once(lambda dt: self._on_rate_ack_timeout(seq), RATE_ACK_TIMEOUT)
+        try:
+            payload = json.dumps(dict(RATE_MODES[mode], mode=mode, seq=seq))
+            self.mqtt_client.publish(RATE_CONTROL_TOPIC, payload, qos=1, retain=True)
+            self._log_msg(f"📤 请求上报模式[{mode}]：{payload}")
+            return True
+        except Exception as e:
+            self._log_msg(f"❌ 下发上报模式失败[{type(e).__name__}]：{str(e)}")
+            return False
+
+    def _resend_rate_mode(self):
+        """连接成功后重新下发期望的上报模式（主线程）"""
+        if self.rate_mode_requested and self.connected:
+            self.rate_retry_count = 0
+            self._send_rate_mode(self.rate_mode_requested)
+
+    def _on_rate_ack_timeout(self, seq):
+        """ACK超时：仍是最新请求且未确认时重发，超过次数后等待下次模式变化或重连"""
+        if seq != self.rate_seq or self.rate_seq_acked == seq or not self.connected:
+            return
+        if self.rate_retry_count >= RATE_MAX_RETRIES:
+            self._log_msg(f"⚠️ 设备未确认上报模式[{self.rate_mode_requested}]，已停止重发")
+            return
+        self.rate_retry_count += 1
+        self._log_msg(f"🔄 上报模式ACK超时，第{self.rate_retry_count}/{RATE_MAX_RETRIES}次重发")
+        self._send_rate_mode(self.rate_mode_requested)
+
+    def _on_rate_ack(self, payload):
+        """设备确认上报模式：{"mode": "low", "seq": 3}，只接受最新一次请求的ACK"""
+        try:
+            ack = json.loads(payload)
+            mode = ack.get("mode")
+            seq = ack.get("seq")
+        except (ValueError, AttributeError) as e:
+            self._log_msg(f"❌ 解析上报模式ACK失败[{type(e).__name__}]：{str(e)}")
+            return
+        # 带seq的ACK必须对应最新请求；不带seq的旧固件ACK只要模式与请求一致即可
+        stale = seq != self.rate_seq if seq is not None else mode != self.rate_mode_requested
+        if mode not in RATE_MODES or stale:
+            self._log_msg(f"ℹ️ 忽略过期的上报模式ACK：{payload}")
+            return
+        self.metrics["rate_acks"] += 1
+        self.rate_seq_acked = self.rate_seq
+        self.rate_retry_count = 0
+        if mode != self.rate_mode_acked:
+            self._accumulate_mode_time()
+            self.rate_mode_acked = mode
+            self.metrics["rate_changes"] += 1
+        self._log_msg(f"✅ 设备已切换上报模式：{mode}")
+
+    def _accumulate_mode_time(self):
+        """把当前已确认模式的持续时长计入统计"""
+        now = time.time()
+        mode = self.rate_mode_acked or "unknown"
+        seconds_by_mode = self.metrics["seconds_by_mode"]
+        seconds_by_mode[mode] = seconds_by_mode.get(mode, 0) + now - self.rate_mode_since
+        self.rate_mode_since = now
+
+    def _count_rx_bytes(self, size):
+        mode = self.rate_mode_acked or "unknown"
+        bytes_by_mode = self.metrics["rx_bytes_by_mode"]
+        bytes_by_mode[mode] = bytes_by_mode.get(mode, 0) + size
+        self.metrics["rx_messages"] += 1
+        self.metrics["rx_bytes"] += size
+
+    def expected_report_interval(self):
+        """当前预期的上报间隔（秒）；模式切换未确认期间取两者中较长的，避免误判离线"""
+        return max(report_interval_seconds(self.rate_mode_acked),
+                   report_interval_seconds(self.rate_mode_requested))
+
+    def get_metrics(self):
+        """返回流量统计快照，含各模式下的平均流量（字节/分钟），用于对比节省的带宽"""
+        self._accumulate_mode_time()
+        metrics = dict(self.metrics)
+        metrics["rx_bytes_by_mode"] = dict(self.metrics["rx_bytes_by_mode"])
+        metrics["seconds_by_mode"] = dict(self.metrics["seconds_by_mode"])
+        metrics["bytes_per_minute_by_mode"] = {
+            mode: round(metrics["rx_bytes_by_mode"].get(mode, 0) * 60 / seconds, 1)
+            for mode, seconds in metrics["seconds_by_mode"].items() if seconds > 0
+        }
+        metrics["rate_mode_requested"] = self.rate_mode_requested
+        metrics["rate_mode_acked"] = self.rate_mode_acked
+        return metrics
+
     def _reconnect(self):
         """自动重连"""
         if self.reconnect_count < self.max_reconnect_attempts:
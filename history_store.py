@@ -0,0 +1,119 @@
+# history_store.py：降采样历史数据存储（按分钟取均值，按天追加写入二进制文件）
+import datetime
+import json
+import math
+import os
+import struct
+import time
+
+# 每条记录：当天第几分钟 + 该分钟读数条数 + 溶解氧/PH/温度分钟均值（缺失为NaN），小端紧凑排列
+# 同一分钟可能有多条记录（如切后台时提前落盘），读取时按条数加权合并
+RECORD_FORMAT = "<HHfff"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+HISTORY_FIELDS = ("do", "ph", "temp")
+THRESHOLDS_FILE = "thresholds.json"
+
+
+def day_file_path(history_dir, day):
+    """某天的历史数据文件路径（day为datetime.date）"""
+    return os.path.join(history_dir, f"{day.isoformat()}.bin")
+
+
+class HistoryStore:
+    """在主线程接收实时读数，累积成分钟均值后追加写入当天文件
+
+    每天一个文件，只追加不修改，文件大小即可作为该天数据的版本号，
+    报表缓存据此判断是否有新数据到达。
+    """
+
+    def __init__(self, history_dir):
+        self.history_dir = history_dir
+        self.pending_key = None   # (日期, 当天第几分钟)
+        self.pending_readings = 0
+        self.pending_sums = {}
+        self.pending_counts = {}
+        os.makedirs(history_dir, exist_ok=True)
+
+    def add_reading(self, parsed_data, ts=None):
+        """记录一次上报；跨分钟时把上一分钟的均值落盘"""
+        ts = time.time() if ts is None else ts
+        local_time = datetime.datetime.fromtimestamp(ts)
+        key = (local_time.date(), local_time.hour * 60 + local_time.minute)
+        if key != self.pending_key:
+            self.flush()
+            self.pending_key = key
+
+        self.pending_readings += 1
+        for field in HISTORY_FIELDS:
+            try:
+                value = float(parsed_data[field])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if math.isnan(value):
+                continue
+            self.pending_sums[field] = self.pending_sums.get(field, 0.0) + value
+            self.pending_counts[field] = self.pending_counts.get(field, 0) + 1
+
+    def flush(self):
+        """把正在累积的分钟均值写入文件"""
+        if self.pending_key is None or not self.pending_counts:
+            self.pending_key = None
+            return False
+        day, minute = self.pending_key
+        values = [
+            self.pending_sums[field] / self.pending_counts[field] if field in self.pending_counts else float("nan")
+            for field in HISTORY_FIELDS
+        ]
+        weight = min(self.pending_readings, 0xFFFF)
+        self.pending_key = None
+        self.pending_readings = 0
+        self.pending_sums = {}
+        self.pending_counts = {}
+        try:
+            with open(day_file_path(self.history_dir, day), "ab") as f:
+                f.write(struct.pack(RECORD_FORMAT, minute, weight, *values))
+            return True
+        except OSError as e:
+            print(f"❌ 历史数据写入失败[{type(e).__name__}]：{str(e)}")
+            return False
+
+    def add_thresholds(self, min_do, max_do, ts=None):
+        """记录一次阈值设置，报表按各时段生效的阈值统计"""
+        thresholds = self.load_thresholds()
+        thresholds.append([time.time() if ts is None else ts, float(min_do), float(max_do)])
+        path = os.path.join(self.history_dir, THRESHOLDS_FILE)
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(thresholds, f, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"❌ 阈值历史写入失败[{type(e).__name__}]：{str(e)}")
+
+    def load_thresholds(self):
+        """读取阈值历史：[[生效时间戳, 最低值, 最高值], ...]，按时间排序"""
+        return load_thresholds(self.history_dir)
+
+
+def _is_threshold_row(row):
+    """合法的阈值记录：[生效时间戳, 最低值, 最高值]，均为有限数字"""
+    return isinstance(row, list) and len(row) == 3 and all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+        for value in row)
+
+
+def load_thresholds(history_dir):
+    try:
+        with open(os.path.join(history_dir, THRESHOLDS_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 阈值历史读取失败[{type(e).__name__}]：{str(e)}")
+        return []
+    if not isinstance(data, list):
+        print(f"⚠️ 阈值历史格式错误，已忽略：{type(data).__name__}")
+        return []
+    rows = [row for row in data if _is_threshold_row(row)]
+    if len(rows) != len(data):
+        print(f"⚠️ 阈值历史中有{len(data) - len(rows)}条无效记录，已跳过")
+    return sorted(rows)
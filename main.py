@@ -4,6 +4,24 @@ from kivy.config import Config
 # 全局变量：存储接收的日志数据
 recv_data_list = []
 
+# 显示实时读数的页面（在这些页面时请求设备高频上报）
+LIVE_PAGES = ("home",)
+# PH值安全范围
+PH_SAFE_RANGE = (6.0, 9.0)
+# 告警回差：告警后读数需回到范围内该幅度以上才解除，避免在阈值附近反复切换上报模式
+ALARM_DO_HYSTERESIS = 0.2
+ALARM_PH_HYSTERESIS = 0.1
+# 单次告警突发上报的最长时长（秒），之后按前后台/页面恢复正常速率
+BURST_MAX_SECONDS = 120
+# 首页读数时长标注的刷新间隔（秒）
+AGE_REFRESH_INTERVAL = 5
+# 上报模式中文名
+RATE_MODE_NAMES = {"high": "高频", "low": "低频批量", "burst": "告警突发"}
+# 日报统计天数
+REPORT_DAYS = 30
+# 日报统计超时（秒），超时后放弃等待该次结果，允许重新发起统计
+REPORT_TIMEOUT = 15
+
 # 配置手机窗口尺寸（竖屏）
 Config.set('graphics', 'width', '360')
 Config.set('graphics', 'height', '640')
@@ -23,9 +41,16 @@ from kivymd.uix.textfield import MDTextField
 from kivymd.toast import toast
 import datetime
 import json
+import os
+import time
 
 # 导入MQTT工具类
 from esp32_mqtt_utils import Esp32MqttClient
+# 导入最后已知状态缓存
+from state_cache import LastStateCache, DEFAULT_DEVICE_ID, format_age, resolve_sample_ts
+# 导入历史数据存储和日报统计
+from history_store import HistoryStore
+from reports import ReportService
 
 # 自定义无边界按钮（复用原有逻辑）
 class NoBorderButton(MDBoxLayout):
@@ -79,11 +104,20 @@ def register_chinese_font():
 # 页面切换工具函数
 def switch_page(app_instance, page_name):
     app_instance.page_container.clear_widgets()
+    app_instance.update_sensor_ui = None  # 首页构建时重新绑定
+    app_instance.update_switch_ui = None
+    if app_instance.age_refresh_event:
+        app_instance.age_refresh_event.cancel()
+        app_instance.age_refresh_event = None
     if page_name == "home":
         app_instance.current_page = create_home_page(app_instance)
     elif page_name == "me":
         app_instance.current_page = create_me_page(app_instance)
+    elif page_name == "report":
+        app_instance.current_page = create_report_page(app_instance)
+    app_instance.current_page_name = page_name
     app_instance.page_container.add_widget(app_instance.current_page)
+    app_instance._update_rate_mode()
 
 # 首页构建
 def create_home_page(app_instance):
@@ -103,7 +137,7 @@ def create_home_page(app_instance):
         height=dp(30)
     )
     do_label = MDLabel(
-        text="溶解氧: 7.25mg/L",
+        text="溶解氧: --mg/L",
         font_size=dp(18),
         font_name="CustomChinese",
         halign="left",
@@ -112,36 +146,51 @@ def create_home_page(app_instance):
         text_color=(0, 0, 1, 1)
     )
     ph_label = MDLabel(
-        text="PH值: 7.0",
+        text="PH值: --",
         font_size=dp(18),
         font_name="CustomChinese",
         theme_text_color="Custom",
         text_color=(0, 0, 1, 1)
     )
     temp_label = MDLabel(
-        text="温度: 25.5℃",
+        text="温度: --℃",
         font_size=dp(18),
         font_name="CustomChinese",
         theme_text_color="Custom",
         text_color=(0, 0, 1, 1)
     )
 
-    def update_sensor_ui(parsed_data):
+    def update_sensor_ui(parsed_data, age_text=""):
+        # age_text非空表示显示的是缓存值，附带数据时长
+        suffix = f"（{age_text}）" if age_text else ""
         try:
             if "do" in parsed_data and parsed_data["do"] is not None:
                 do_value = round(float(parsed_data["do"]), 2)
-                do_label.text = f"溶解氧: {do_value}mg/L"
+                do_label.text = f"溶解氧: {do_value}mg/L{suffix}"
             if "ph" in parsed_data and parsed_data["ph"] is not None:
                 ph_value = round(float(parsed_data["ph"]), 1)
-                ph_label.text = f"PH值: {ph_value}"
+                ph_label.text = f"PH值: {ph_value}{suffix}"
             if "temp" in parsed_data and parsed_data["temp"] is not None:
                 temp_value = round(float(parsed_data["temp"]), 1)
-                temp_label.text = f"温度: {temp_value}℃"
+                temp_label.text = f"温度: {temp_value}℃{suffix}"
         except (ValueError, TypeError):
             do_label.text = "溶解氧: 数据异常mg/L"
             ph_label.text = "PH值: 数据异常"
             temp_label.text = "温度: 数据异常℃"
 
+    # 首帧显示缓存的最后已知读数（标注数据时长），收到实时数据后覆盖
+    state_cache = app_instance.state_cache
+    if state_cache:
+        now = time.time()
+        for field in ("do", "ph", "temp"):
+            value, ts = state_cache.get_field(DEFAULT_DEVICE_ID, field)
+            if value is not None:
+                update_sensor_ui({field: value}, format_age(now - ts))
+    app_instance.update_sensor_ui = update_sensor_ui
+    # 首页显示期间定时刷新读数后的数据时长，设备停止上报后数字不会一直像是最新的
+    app_instance.age_refresh_event = Clock.schedule_interval(
+        lambda dt: app_instance._refresh_home_from_cache(("do", "ph", "temp")), AGE_REFRESH_INTERVAL)
+
     # 手动开关
     switch_label = MDLabel(
         text="手动开关",
@@ -162,6 +211,17 @@ def create_home_page(app_instance):
     )
     switch_btn.app_instance = app_instance
 
+    def update_switch_ui(switch_value):
+        # switch_value为设备指令格式："yes"/"no"
+        if switch_value in ("yes", "no"):
+            switch_btn.current_state = "开" if switch_value == "yes" else "关"
+            switch_btn.label.text = switch_btn.current_state
+            switch_btn.update_button_colors()
+
+    if state_cache:
+        update_switch_ui(state_cache.get_field(DEFAULT_DEVICE_ID, "switch")[0])
+    app_instance.update_switch_ui = update_switch_ui
+
     def toggle_switch(instance):
         instance.current_state = "开" if instance.current_state == "关" else "关"
         instance.label.text = instance.current_state
@@ -180,6 +240,8 @@ def create_home_page(app_instance):
             
             send_result = mqtt_client.publish_command("esp32/switch", send_data)
             if send_result:
+                if instance.app_instance.state_cache:
+                    instance.app_instance.state_cache.set_field(DEFAULT_DEVICE_ID, "switch", send_data)
                 toast(f"设备{cmd_desc}成功")
             else:
                 raise Exception("MQTT未连接")
@@ -230,6 +292,13 @@ def create_home_page(app_instance):
     min_input.add_widget(min_label)
     min_input.add_widget(min_textfield)
 
+    # 回填上次设置的阈值
+    if state_cache:
+        cached_thresholds, _ = state_cache.get_field(DEFAULT_DEVICE_ID, "thresholds")
+        if isinstance(cached_thresholds, dict):
+            max_textfield.text = str(cached_thresholds.get("max_do", ""))
+            min_textfield.text = str(cached_thresholds.get("min_do", ""))
+
     input_container.add_widget(max_input)
     input_container.add_widget(min_input)
 
@@ -283,6 +352,11 @@ def create_home_page(app_instance):
             
             send_result = mqtt_client.publish_command("esp32/threshold", threshold_data)
             if send_result:
+                if app_instance.state_cache:
+                    app_instance.state_cache.set_field(
+                        DEFAULT_DEVICE_ID, "thresholds", {"max_do": max_val, "min_do": min_val})
+                if app_instance.history_store:
+                    app_instance.history_store.add_thresholds(min_val, max_val)
                 success_msg = f"✅ 阈值已发送：最高{max_val} | 最低{min_val}"
                 app_instance._update_recv_data(success_msg)
                 toast("阈值设置成功")
@@ -383,17 +457,41 @@ def create_me_page(app_instance):
         height=dp(40)
     )
     me_layout.add_widget(status_label)
+
+    # 上报模式及流量统计
+    if hasattr(app_instance, 'mqtt_client') and app_instance.mqtt_client:
+        metrics = app_instance.mqtt_client.get_metrics()
+        acked_mode = metrics["rate_mode_acked"]
+        rate_text = f"上报模式：{RATE_MODE_NAMES.get(acked_mode, '未确认')}"
+        if metrics["rate_mode_requested"] != acked_mode:
+            rate_text += f"（请求{RATE_MODE_NAMES.get(metrics['rate_mode_requested'], '-')}中）"
+        rate_text += f" | 已接收{metrics['rx_bytes'] / 1024:.1f}KB"
+        me_layout.add_widget(MDLabel(
+            text=rate_text,
+            font_size=dp(16),
+            font_name="CustomChinese",
+            size_hint_y=None,
+            height=dp(30)
+        ))
     
     # 设备信息
     me_layout.add_widget(MDLabel(
-        text="设备编号：DEV-20260111",
+        text=f"设备编号：{DEFAULT_DEVICE_ID}",
         font_size=dp(16),
         font_name="CustomChinese",
         size_hint_y=None,
         height=dp(30)
     ))
+    # 在线状态：根据缓存中设备的最后上报时间判断
+    online_text = "当前在线：未知"
+    state_cache = app_instance.state_cache
+    if state_cache and state_cache.last_seen() is not None:
+        age_text = format_age(time.time() - state_cache.last_seen())
+        report_interval = app_instance.mqtt_client.expected_report_interval() if app_instance.mqtt_client else 0
+        is_online = state_cache.is_online(report_interval=report_interval)
+        online_text = f"当前在线：{'是' if is_online else '否'}（最后上报{age_text}）"
     me_layout.add_widget(MDLabel(
-        text="当前在线：是",
+        text=online_text,
         font_size=dp(16),
         font_name="CustomChinese",
         size_hint_y=None,
@@ -428,6 +526,85 @@ def create_me_page(app_instance):
 
     return me_layout
 
+# 日报文本格式化
+def format_report_text(summaries):
+    lines = []
+    for summary in summaries:
+        day = summary["day"][5:]
+        if not summary["samples"]:
+            lines.append(f"{day}  无数据")
+            continue
+        lines.append(f"{day}  记录{summary['samples']}分钟")
+        if summary["threshold_minutes"]:
+            lines.append(f"    低于溶解氧下限：{summary['do_below_min_minutes']}分钟")
+        else:
+            lines.append("    低于溶解氧下限：未设置阈值")
+        lines.append(f"    PH超出6~9：{summary['ph_out_of_range_hours']}小时")
+        if summary["temp_range"] is not None:
+            lines.append(f"    温度：{summary['temp_min']}~{summary['temp_max']}℃（温差{summary['temp_range']}℃）")
+
+    # 最近一天有数据的溶解氧日变化（按小时均值）
+    latest = next((summary for summary in summaries if summary["samples"]), None)
+    if latest:
+        lines.append("")
+        lines.append(f"溶解氧日变化（{latest['day'][5:]}）：")
+        hourly = [f"{hour}时{value}" for hour, value in enumerate(latest["do_hourly"]) if value is not None]
+        for i in range(0, len(hourly), 4):
+            lines.append("  ".join(hourly[i:i + 4]))
+    return "\n".join(lines)
+
+# 日报页面（统计在后台工作线程中计算，完成后刷新）
+def create_report_page(app_instance):
+    report_layout = MDBoxLayout(
+        orientation="vertical",
+        padding=dp(20),
+        spacing=dp(15),
+        size_hint_y=None,
+    )
+    report_layout.bind(minimum_height=report_layout.setter('height'))
+
+    report_layout.add_widget(MDLabel(
+        text=f"近{REPORT_DAYS}天日报",
+        font_size=dp(20),
+        font_name="CustomChinese",
+        halign="center",
+        bold=True,
+        size_hint_y=None,
+        height=dp(60)
+    ))
+    status_label = MDLabel(
+        text="统计中...",
+        font_size=dp(14),
+        font_name="CustomChinese",
+        theme_text_color="Custom",
+        text_color=(0.5, 0.5, 0.5, 1),
+        size_hint_y=None,
+        height=dp(30)
+    )
+    status_label.is_report_status_label = True
+    report_layout.add_widget(status_label)
+
+    report_scroll_view = ScrollView(
+        size_hint=(1, None),
+        height=dp(380),
+        do_scroll_x=False
+    )
+    report_label = MDLabel(
+        text=format_report_text(app_instance.report_summaries) if app_instance.report_summaries else "",
+        font_name="CustomChinese",
+        size_hint_y=None,
+        valign="top",
+        halign="left"
+    )
+    report_label.is_report_label = True  # 标记为日报标签
+    report_label.bind(texture_size=report_label.setter('size'))
+    report_scroll_view.add_widget(report_label)
+    report_layout.add_widget(report_scroll_view)
+
+    # 先显示上次结果，同时后台重新统计（未变化的日期直接读缓存）
+    app_instance._request_report()
+    return report_layout
+
 # 整体UI构建
 def create_app_ui(app_instance):
     Window.orientation = 'portrait'
@@ -460,8 +637,8 @@ def create_app_ui(app_instance):
         orientation="horizontal",
         size_hint_y=None,
         height=dp(60),
-        padding=[dp(60), dp(5), dp(60), dp(5)],
-        spacing=Window.size[0] * 0.2,
+        padding=[dp(30), dp(5), dp(30), dp(5)],
+        spacing=Window.size[0] * 0.1,
         md_bg_color=(1, 1, 1, 1)
     )
     with bottom_nav_bar.canvas.before:
@@ -484,7 +661,16 @@ def create_app_ui(app_instance):
     nav_item2.add_widget(nav_item2_icon)
     nav_item2.add_widget(nav_item2_text)
 
+    # 日报导航
+    nav_item3 = MDBoxLayout(orientation="vertical", size_hint_x=1, spacing=dp(2))
+    nav_item3_icon = MDIconButton(icon="chart-bar", size_hint=(None, None), size=(dp(24), dp(24)), md_bg_color=(1,1,1,0))
+    nav_item3_icon.bind(on_press=lambda x: switch_page(app_instance, "report"))
+    nav_item3_text = MDLabel(text="日报", font_size=dp(12), font_name="CustomChinese", halign="center")
+    nav_item3.add_widget(nav_item3_icon)
+    nav_item3.add_widget(nav_item3_text)
+
     bottom_nav_bar.add_widget(nav_item1)
+    bottom_nav_bar.add_widget(nav_item3)
     bottom_nav_bar.add_widget(nav_item2)
     main_container.add_widget(bottom_nav_bar)
 
@@ -504,8 +690,30 @@ class Esp32MobileApp(MDApp):
         self.mqtt_client = None
         self.page_container = None
         self.current_page = None
+        self.state_cache = None
+        self.update_sensor_ui = None
+        self.update_switch_ui = None
+        self.age_refresh_event = None
+        # 生命周期与告警状态（决定设备上报速率）
+        self.current_page_name = "home"
+        self.is_paused = False
+        self.alarm_active = False
+        self.burst_timeout_event = None  # 非空表示正处于告警突发上报期间
+        # 历史数据与日报
+        self.history_store = None
+        self.report_service = None
+        self.report_summaries = None
+        self.report_request_time = None
+        self.report_request_id = 0
+        self.report_timeout_event = None
 
     def build(self):
+        # 首帧之前同步加载最后已知状态，避免显示占位假数据
+        self.state_cache = LastStateCache(os.path.join(self.user_data_dir, "last_state.json")).load()
+        Clock.schedule_interval(lambda dt: self.state_cache.flush_if_due(), self.state_cache.save_interval)
+        history_dir = os.path.join(self.user_data_dir, "history")
+        self.history_store = HistoryStore(history_dir)
+        self.report_service = ReportService(history_dir, os.path.join(self.user_data_dir, "reports"))
         main_layout = create_app_ui(self)
         # 延长初始化延迟（适配手机）
         Clock.schedule_once(lambda dt: self._init_mqtt_client(), 3)
@@ -518,10 +726,196 @@ class Esp32MobileApp(MDApp):
             port=self.mqtt_config["port"],
             username=self.mqtt_config["username"],
             password=self.mqtt_config["password"],
-            data_callback=self._update_recv_data
+            data_callback=self._update_recv_data,
+            message_callback=self._on_mqtt_message
         )
+        self._update_rate_mode()
         self.mqtt_client.start_mqtt()
 
+    def _update_rate_mode(self):
+        """根据告警、前后台和当前页面计算期望的上报模式并下发"""
+        if self.alarm_active and self.burst_timeout_event is not None:
+            mode = "burst"
+        elif self.is_paused or self.current_page_name not in LIVE_PAGES:
+            mode = "low"
+        else:
+            mode = "high"
+        if self.mqtt_client:
+            self.mqtt_client.set_rate_mode(mode)
+
+    def _check_alarm(self, device_id=DEFAULT_DEVICE_ID):
+        """读数超出阈值（溶解氧）或安全范围（PH）时进入告警，状态变化时切换上报模式
+
+        已告警时范围按回差收窄，读数需明显回到范围内才解除告警
+        """
+        alarm = False
+        do_margin = ALARM_DO_HYSTERESIS if self.alarm_active else 0
+        ph_margin = ALARM_PH_HYSTERESIS if self.alarm_active else 0
+        do_value, _ = self.state_cache.get_field(device_id, "do")
+        ph_value, _ = self.state_cache.get_field(device_id, "ph")
+        thresholds, _ = self.state_cache.get_field(device_id, "thresholds")
+        if do_value is not None and isinstance(thresholds, dict):
+            try:
+                alarm = not (float(thresholds["min_do"]) + do_margin
+                             <= do_value <= float(thresholds["max_do"]) - do_margin)
+            except (KeyError, TypeError, ValueError):
+                pass
+        if ph_value is not None and not PH_SAFE_RANGE[0] + ph_margin <= ph_value <= PH_SAFE_RANGE[1] - ph_margin:
+            alarm = True
+
+        if alarm != self.alarm_active:
+            self.alarm_active = alarm
+            if self.burst_timeout_event:
+                self.burst_timeout_event.cancel()
+                self.burst_timeout_event = None
+            if alarm:
+                # 突发上报到时后按当前前后台/页面恢复正常速率（告警未解除也不再突发）
+                self.burst_timeout_event = Clock.schedule_once(lambda dt: self._end_burst(), BURST_MAX_SECONDS)
+                self._update_recv_data(f"🚨 读数超出范围，请求设备突发上报（最长{BURST_MAX_SECONDS}秒）")
+            else:
+                self._update_recv_data("✅ 读数恢复正常")
+            self._update_rate_mode()
+
+    def _end_burst(self):
+        """告警突发上报到时，恢复正常上报速率"""
+        self.burst_timeout_event = None
+        self._update_recv_data("ℹ️ 告警突发上报已到最长时长，恢复正常上报速率")
+        self._update_rate_mode()
+
+    def _on_mqtt_message(self, topic, payload):
+        """处理设备消息：写入状态缓存并刷新首页读数"""
+        if topic == "esp32/status":
+            # 保留消息在每次连接时都会重放，到达时间不代表设备在线，不更新最后上报时间
+            self.state_cache.set_field(DEFAULT_DEVICE_ID, "status", payload.strip(), touch_last_seen=False)
+            self.state_cache.flush_if_due()
+            return
+        if topic not in ("esp32/data", "esp32/shadow"):
+            return
+
+        try:
+            parsed_data = json.loads(payload)
+            if not isinstance(parsed_data, dict):
+                raise ValueError("消息不是JSON对象")
+        except ValueError as e:
+            self._update_recv_data(f"❌ 解析{topic}失败：{str(e)}")
+            return
+
+        if topic == "esp32/data":
+            device_id = parsed_data.get("device_id", DEFAULT_DEVICE_ID)
+            # 低频模式下设备批量上报：{"batch": [{"ts": ..., "do": ...}, ...]}，逐个样本按采样时间处理
+            samples = parsed_data["batch"] if isinstance(parsed_data.get("batch"), list) else [parsed_data]
+            now = time.time()
+            report_interval = self.mqtt_client.expected_report_interval() if self.mqtt_client else 0
+            latest_sample, latest_ts = None, None
+            for sample in samples:
+                if not isinstance(sample, dict):
+                    continue
+                ts = resolve_sample_ts(sample.get("ts"), now, report_interval)
+                self.state_cache.update_readings(device_id, sample, ts)
+                if device_id == DEFAULT_DEVICE_ID:
+                    self.history_store.add_reading(sample, ts)
+                if latest_ts is None or ts >= latest_ts:
+                    latest_sample, latest_ts = sample, ts
+            if device_id == DEFAULT_DEVICE_ID and latest_sample is not None:
+                self._check_alarm(device_id)
+                if self.update_sensor_ui:
+                    # 批量数据中的最新样本也可能是几十秒前采集的，标注数据时长
+                    age_text = format_age(now - latest_ts) if now - latest_ts >= 10 else ""
+                    self.update_sensor_ui(latest_sample, age_text)
+        else:
+            updated_fields = self.state_cache.reconcile_shadow(parsed_data)
+            if updated_fields:
+                self._update_recv_data(f"🔄 影子状态已同步：{', '.join(updated_fields)}")
+                # 原地刷新首页控件，不重建页面（保留正在输入的阈值，也不打断其他页面）
+                device_id = parsed_data.get("device_id", DEFAULT_DEVICE_ID)
+                if device_id == DEFAULT_DEVICE_ID:
+                    self._refresh_home_from_cache(updated_fields)
+        self.state_cache.flush_if_due()
+
+    def _refresh_home_from_cache(self, fields):
+        """用缓存中的值原地更新首页读数和开关（首页未显示时不处理）"""
+        now = time.time()
+        for field in fields:
+            value, ts = self.state_cache.get_field(DEFAULT_DEVICE_ID, field)
+            if value is None:
+                continue
+            if field in ("do", "ph", "temp") and self.update_sensor_ui:
+                self.update_sensor_ui({field: value}, format_age(now - ts))
+            elif field == "switch" and self.update_switch_ui:
+                self.update_switch_ui(value)
+
+    def _request_report(self):
+        """后台生成日报，完成后回到主线程刷新页面"""
+        if self.report_request_time is not None:
+            return  # 上一次统计尚未完成
+        self.report_request_time = time.time()
+        self.report_request_id += 1
+        request_id = self.report_request_id
+        # 看门狗：统计卡住时不能让日报页面永远停在“统计中”
+        self.report_timeout_event = Clock.schedule_once(
+            lambda dt: self._on_report_timeout(request_id), REPORT_TIMEOUT)
+        self.report_service.request_report(
+            REPORT_DAYS,
+            lambda summaries, error: Clock.schedule_once(
+                lambda dt: self._on_report_ready(request_id, summaries, error), 0)
+        )
+
+    def _on_report_timeout(self, request_id):
+        """日报统计超时：放弃等待本次结果（卡住的守护线程无法强制结束，但不会阻塞退出）"""
+        if request_id != self.report_request_id or self.report_request_time is None:
+            return
+        self.report_request_time = None
+        status_text = f"❌ 日报统计超时（{REPORT_TIMEOUT}秒），请稍后重试"
+        self._update_recv_data(status_text)
+        self._update_report_page(status_text, None)
+
+    def _on_report_ready(self, request_id, summaries, error):
+        """日报计算完成（主线程）"""
+        if request_id != self.report_request_id or self.report_request_time is None:
+            return  # 已超时被丢弃的请求
+        if self.report_timeout_event:
+            self.report_timeout_event.cancel()
+        elapsed_ms = int((time.time() - self.report_request_time) * 1000)
+        self.report_request_time = None
+        if error is not None:
+            status_text = f"❌ 日报统计失败[{type(error).__name__}]：{str(error)}"
+            self._update_recv_data(status_text)
+        else:
+            self.report_summaries = summaries
+            status_text = f"已更新（耗时{elapsed_ms}ms）"
+        self._update_report_page(status_text, summaries)
+
+    def _update_report_page(self, status_text, summaries):
+        """仅在日报页面更新UI"""
+        if self.current_page_name == "report" and self.current_page:
+            for child in self.current_page.walk():
+                if getattr(child, 'is_report_status_label', False):
+                    child.text = status_text
+                elif getattr(child, 'is_report_label', False) and summaries is not None:
+                    child.text = format_report_text(summaries)
+
+    def on_pause(self):
+        """切到后台：保存缓存并请求低频批量上报"""
+        self.is_paused = True
+        if self.state_cache:
+            self.state_cache.flush()
+        if self.history_store:
+            self.history_store.flush()
+        self._update_rate_mode()
+        return True
+
+    def on_resume(self):
+        """回到前台：按当前页面恢复上报速率"""
+        self.is_paused = False
+        self._update_rate_mode()
+
+    def on_stop(self):
+        """退出时强制保存状态缓存和历史数据"""
+        if self.state_cache:
+            self.state_cache.flush()
+        if self.history_store:
+            self.history_store.flush()
+
     def _update_recv_data(self, content):
         """更新个人中心日志"""
         global recv_data_list
@@ -0,0 +1,177 @@
+# reports.py：日报统计（在后台工作线程中用numpy向量化计算，按天缓存结果）
+import datetime
+import json
+import math
+import os
+import threading
+import time
+
+from history_store import RECORD_SIZE, day_file_path, load_thresholds
+
+# 注意：numpy只在统计函数内部导入，避免主线程启动时加载拖慢首帧
+
+# 与history_store.RECORD_FORMAT对应的numpy结构化类型字段
+RECORD_FIELDS = [("minute", "<u2"), ("weight", "<u2"), ("do", "<f4"), ("ph", "<f4"), ("temp", "<f4")]
+
+# 缓存格式变化时递增，旧缓存自动失效
+REPORT_CACHE_VERSION = 2
+
+
+def _record_dtype():
+    import numpy as np
+    dtype = np.dtype(RECORD_FIELDS)
+    assert dtype.itemsize == RECORD_SIZE
+    return dtype
+
+
+def _round_or_none(value, ndigits):
+    value = float(value)
+    return None if math.isnan(value) else round(value, ndigits)
+
+
+def load_day_records(history_dir, day):
+    """读取某天的分钟记录，返回 (记录数组, 文件大小)；同一分钟有多条时按读数条数加权合并"""
+    import numpy as np
+    record_dtype = _record_dtype()
+    path = day_file_path(history_dir, day)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return np.zeros(0, dtype=record_dtype), 0
+    # 只读完整的记录，忽略正在追加的半条
+    count = size // record_dtype.itemsize
+    records = np.fromfile(path, dtype=record_dtype, count=count)
+    minutes, inverse = np.unique(records["minute"], return_inverse=True)
+    if len(minutes) == len(records):
+        return records, size
+
+    merged = np.zeros(len(minutes), dtype=record_dtype)
+    merged["minute"] = minutes
+    weights = np.maximum(records["weight"], 1).astype(np.float64)
+    merged["weight"] = np.minimum(np.bincount(inverse, weights=weights), 0xFFFF)
+    for field in ("do", "ph", "temp"):
+        values = records[field].astype(np.float64)
+        valid = ~np.isnan(values)
+        field_weights = np.where(valid, weights, 0)
+        weighted_sum = np.bincount(inverse, weights=np.where(valid, values, 0) * field_weights, minlength=len(minutes))
+        weight_sum = np.bincount(inverse, weights=field_weights, minlength=len(minutes))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            merged[field] = weighted_sum / weight_sum
+    return merged, size
+
+
+def compute_day_summary(records, day, thresholds, ph_range=(6.0, 9.0)):
+    """计算单日统计（每条记录代表1分钟）
+
+    thresholds: [[生效时间戳, 最低值, 最高值], ...]，每个样本按其时刻生效的阈值统计
+    """
+    import numpy as np
+    minutes = records["minute"].astype(np.int64)
+    do = records["do"].astype(np.float64)
+    ph = records["ph"].astype(np.float64)
+    temp = records["temp"].astype(np.float64)
+
+    # 每个样本时刻生效的溶解氧最低值（阈值设置前的样本为NaN，不参与统计）
+    min_do = np.full(len(minutes), np.nan)
+    if thresholds:
+        threshold_array = np.asarray(thresholds, dtype=np.float64)
+        day_start = time.mktime(day.timetuple())
+        index = np.searchsorted(threshold_array[:, 0], day_start + minutes * 60, side="right") - 1
+        active = index >= 0
+        min_do[active] = threshold_array[index[active], 1]
+    threshold_active = ~np.isnan(min_do)
+
+    valid_ph = ~np.isnan(ph)
+    ph_out_of_range = valid_ph & ((ph < ph_range[0]) | (ph > ph_range[1]))
+
+    # 溶解氧日变化曲线：按小时求均值
+    valid_do = ~np.isnan(do)
+    hours = minutes[valid_do] // 60
+    hourly_sum = np.bincount(hours, weights=do[valid_do], minlength=24)
+    hourly_count = np.bincount(hours, minlength=24)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        do_hourly = hourly_sum / hourly_count
+
+    valid_temp = temp[~np.isnan(temp)]
+    temp_min = valid_temp.min() if len(valid_temp) else np.nan
+    temp_max = valid_temp.max() if len(valid_temp) else np.nan
+
+    return {
+        "day": day.isoformat(),
+        "samples": int(len(minutes)),
+        "threshold_minutes": int(threshold_active.sum()),
+        "do_below_min_minutes": int((threshold_active & valid_do & (do < min_do)).sum()),
+        "ph_out_of_range_hours": round(int(ph_out_of_range.sum()) / 60, 1),
+        "temp_min": _round_or_none(temp_min, 1),
+        "temp_max": _round_or_none(temp_max, 1),
+        "temp_range": _round_or_none(temp_max - temp_min, 1),
+        "do_hourly": [_round_or_none(value, 2) for value in do_hourly],
+    }
+
+
+def build_report(history_dir, cache_dir, days, today=None):
+    """工作线程入口：返回最近days天（新→旧）的日报列表
+
+    每天的结果缓存为一个JSON文件，记录计算时数据文件的大小；
+    历史文件只追加，大小不变即该天没有新数据，直接复用缓存。
+    """
+    today = today or datetime.date.today()
+    thresholds = load_thresholds(history_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    summaries = []
+    for offset in range(days):
+        day = today - datetime.timedelta(days=offset)
+        cache_path = os.path.join(cache_dir, f"{day.isoformat()}.json")
+        try:
+            source_size = os.path.getsize(day_file_path(history_dir, day))
+        except OSError:
+            source_size = 0
+
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == REPORT_CACHE_VERSION and cached.get("source_size") == source_size:
+                summaries.append(cached["summary"])
+                continue
+        except (OSError, ValueError, KeyError):
+            pass
+
+        records, source_size = load_day_records(history_dir, day)
+        summary = compute_day_summary(records, day, thresholds)
+        summaries.append(summary)
+        try:
+            # 超时被放弃的旧统计线程可能仍在运行，临时文件带线程号，替换写入避免互相覆盖出半个文件
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": REPORT_CACHE_VERSION, "source_size": source_size, "summary": summary},
+                          f, separators=(",", ":"))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️ 日报缓存写入失败[{type(e).__name__}]：{str(e)}")
+    return summaries
+
+
+class ReportService:
+    """每次统计启动一个后台守护线程生成日报，不阻塞Kivy主循环
+
+    不用子进程：Kivy/SDL、paho网络线程等都在本进程中运行，fork多线程进程可能在子进程里死锁。
+    统计主要是numpy运算和文件读写，期间会释放GIL，主循环依然流畅。
+    线程无法从外部强制结束：调用方的超时只能放弃等待结果；守护线程保证卡住的统计不会阻塞App退出。
+    """
+
+    def __init__(self, history_dir, cache_dir):
+        self.history_dir = history_dir
+        self.cache_dir = cache_dir
+
+    def request_report(self, days, callback):
+        """异步生成最近days天的日报；完成后在工作线程中调用 callback(summaries, error)"""
+        def run():
+            try:
+                summaries = build_report(self.history_dir, self.cache_dir, days)
+            except Exception as e:
+                callback(None, e)
+                return
+            callback(summaries, None)
+
+        threading.Thread(target=run, name="report-worker", daemon=True).start()
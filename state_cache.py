@@ -0,0 +1,194 @@
+# state_cache.py：设备最后已知状态缓存（启动首帧直接显示真实数据，无需等待网络）
+import json
+import os
+import time
+
+# 默认设备编号（ESP32上报未携带device_id时使用）
+DEFAULT_DEVICE_ID = "DEV-20260111"
+
+# 缓存的字段：传感器读数、开关状态、阈值、设备状态
+READING_FIELDS = ("do", "ph", "temp")
+STATE_FIELDS = READING_FIELDS + ("switch", "thresholds", "status")
+
+# 超过“上报间隔 + 该时长”未收到上报则视为离线（秒）
+ONLINE_TIMEOUT = 120
+# 视为离线的状态文本
+OFFLINE_STATUS = ("offline", "0", "false", "no", "离线")
+
+# 样本自带时间戳最多允许早于接收时间多久（秒），实际取 max(该值, 上报间隔 × 2)
+SAMPLE_MAX_AGE = 300
+
+CACHE_VERSION = 1
+
+
+def format_age(seconds):
+    """把时长格式化为“N分钟前”之类的中文描述"""
+    seconds = max(0, int(seconds))
+    if seconds < 10:
+        return "刚刚"
+    if seconds < 60:
+        return f"{seconds}秒前"
+    if seconds < 3600:
+        return f"{seconds // 60}分钟前"
+    if seconds < 86400:
+        return f"{seconds // 3600}小时前"
+    return f"{seconds // 86400}天前"
+
+
+def resolve_sample_ts(raw_ts, now, report_interval=0):
+    """校验设备样本自带的采样时间戳，无效时退回接收时间
+
+    未对时的ESP32可能上报开机秒数或0，这类时间戳会被写进1970年的历史文件，
+    早于 now - max(SAMPLE_MAX_AGE, 上报间隔 × 2) 的一律视为无效；晚于now的截断为now。
+    """
+    try:
+        ts = float(raw_ts)
+    except (TypeError, ValueError):
+        return now
+    if not ts > now - max(SAMPLE_MAX_AGE, report_interval * 2):
+        return now
+    return min(ts, now)
+
+
+class LastStateCache:
+    """按设备保存每个字段的最新值及其时间戳：{设备: {字段: [值, 时间戳]}}
+
+    - 启动时同步加载（文件很小，毫秒级），首帧即可显示
+    - 写入节流：数据变化只标记脏，距上次写盘超过 save_interval 才落盘
+    - 与Broker保留的影子状态（shadow）按字段“时间戳新者胜”合并
+    """
+
+    def __init__(self, path, save_interval=10):
+        self.path = path
+        self.save_interval = save_interval
+        self.devices = {}
+        self.dirty = False
+        self.last_save_time = 0
+
+    def load(self):
+        """从磁盘加载缓存（文件不存在或损坏时从空状态开始）"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("version") == CACHE_VERSION \
+                    and isinstance(data.get("devices"), dict):
+                self.devices = data["devices"]
+        except FileNotFoundError:
+            self.devices = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 状态缓存读取失败[{type(e).__name__}]：{str(e)}")
+            self.devices = {}
+        self.dirty = False
+        return self
+
+    def flush(self, force=False):
+        """写盘（先写临时文件再替换，避免写一半被杀进程导致文件损坏）"""
+        if not self.dirty and not force:
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "devices": self.devices},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+            self.last_save_time = time.time()
+            return True
+        except OSError as e:
+            print(f"❌ 状态缓存写入失败[{type(e).__name__}]：{str(e)}")
+            return False
+
+    def flush_if_due(self):
+        """节流写盘：有变化且距上次写盘超过间隔时才写"""
+        if self.dirty and time.time() - self.last_save_time >= self.save_interval:
+            return self.flush()
+        return False
+
+    def _device(self, device_id):
+        return self.devices.setdefault(device_id or DEFAULT_DEVICE_ID, {})
+
+    def set_field(self, device_id, field, value, ts=None, touch_last_seen=True):
+        """更新单个字段；时间戳比缓存旧的值会被忽略，返回是否发生更新
+
+        touch_last_seen=False用于到达时间不代表设备活跃的消息（如Broker重放的保留状态）
+        """
+        ts = time.time() if ts is None else float(ts)
+        device = self._device(device_id)
+        current = device.get(field)
+        if current is not None and current[1] > ts:
+            return False
+        device[field] = [value, ts]
+        if touch_last_seen and ts > device.get("last_seen", 0):
+            device["last_seen"] = ts
+        self.dirty = True
+        return True
+
+    def get_field(self, device_id, field):
+        """返回 (值, 时间戳)，没有缓存时返回 (None, None)"""
+        entry = self.devices.get(device_id or DEFAULT_DEVICE_ID, {}).get(field)
+        if entry is None:
+            return None, None
+        return entry[0], entry[1]
+
+    def update_readings(self, device_id, parsed_data, ts=None):
+        """记录一次传感器上报（只记录能转换为数字的读数）"""
+        ts = time.time() if ts is None else ts
+        updated = False
+        for field in READING_FIELDS:
+            try:
+                value = float(parsed_data[field])
+            except (KeyError, TypeError, ValueError):
+                continue
+            updated = self.set_field(device_id, field, value, ts) or updated
+        if not updated:
+            # 读数无效也说明设备在线
+            device = self._device(device_id)
+            device["last_seen"] = max(device.get("last_seen", 0), ts)
+            self.dirty = True
+        return updated
+
+    def reconcile_shadow(self, shadow):
+        """合并Broker保留的影子状态，按字段取时间戳较新的一方，返回被更新的字段列表
+
+        影子格式：{"device_id": ..., "ts": 时间戳, "do": ..., "switch": "yes", ...}
+        缺少有效ts的影子无法判断新旧，整体忽略（否则首帧会显示成“几万天前”的数据）
+        """
+        device_id = shadow.get("device_id", DEFAULT_DEVICE_ID)
+        try:
+            ts = float(shadow["ts"])
+        except (KeyError, TypeError, ValueError):
+            ts = 0
+        if not ts > 0:
+            print(f"⚠️ 影子状态缺少有效时间戳，已忽略：{shadow}")
+            return []
+        updated = []
+        for field in STATE_FIELDS:
+            if field not in shadow or shadow[field] is None:
+                continue
+            value = shadow[field]
+            if field in READING_FIELDS:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+            if self.set_field(device_id, field, value, ts):
+                updated.append(field)
+        return updated
+
+    def last_seen(self, device_id=None):
+        return self.devices.get(device_id or DEFAULT_DEVICE_ID, {}).get("last_seen")
+
+    def is_online(self, device_id=None, now=None, report_interval=0):
+        """根据最后上报时间和状态判断设备是否在线
+
+        report_interval为设备当前的上报间隔（秒），低频批量模式下两条消息可能相隔十分钟
+        """
+        last_seen = self.last_seen(device_id)
+        if last_seen is None:
+            return False
+        now = time.time() if now is None else now
+        status, _ = self.get_field(device_id, "status")
+        if status is not None and str(status).strip().lower() in OFFLINE_STATUS:
+            return False
+        return now - last_seen <= report_interval + ONLINE_TIMEOUT
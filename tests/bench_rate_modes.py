@@ -0,0 +1,67 @@
+# bench_rate_modes.py：上报模式流量基准
+# 用模拟的设备上报流量驱动Esp32MqttClient，按get_metrics()统计各模式的字节/分钟并给出节省比例
+# 运行：python tests/bench_rate_modes.py [模拟分钟数]
+import contextlib
+import io
+import json
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import esp32_mqtt_utils
+from esp32_mqtt_utils import RATE_MODES, Esp32MqttClient
+from mqtt_fakes import FakeClock, FakeMqttClient, receive, send_ack
+
+START_TIME = 1_800_000_000.0
+
+
+def make_sample(ts):
+    return {"ts": int(ts), "do": 7.12, "ph": 7.03, "temp": 25.4}
+
+
+def make_payload(mode, ts):
+    """按模式生成一条esp32/data消息：单条样本或批量样本"""
+    batch, interval = RATE_MODES[mode]["batch"], RATE_MODES[mode]["interval_ms"] / 1000
+    if batch == 1:
+        return json.dumps(dict(make_sample(ts), device_id="DEV-20260111"))
+    samples = [make_sample(ts - (batch - 1 - i) * interval) for i in range(batch)]
+    return json.dumps({"device_id": "DEV-20260111", "batch": samples})
+
+
+def run_benchmark(minutes=60, modes=("high", "low")):
+    """依次在每个模式下模拟minutes分钟的上报，返回get_metrics()结果"""
+    now = [START_TIME]
+    with mock.patch.object(esp32_mqtt_utils, "Clock", FakeClock()), \
+            mock.patch.object(esp32_mqtt_utils.time, "time", lambda: now[0]), \
+            contextlib.redirect_stdout(io.StringIO()):
+        client = Esp32MqttClient("broker", 8883, "user", "password")
+        client.mqtt_client = FakeMqttClient()
+        client.connected = True
+        for mode in modes:
+            client.set_rate_mode(mode)
+            send_ack(client, mode, seq=client.rate_seq)
+            message_interval = RATE_MODES[mode]["interval_ms"] * RATE_MODES[mode]["batch"] / 1000
+            end_time = now[0] + minutes * 60
+            while now[0] + message_interval <= end_time:
+                now[0] += message_interval
+                receive(client, "esp32/data", make_payload(mode, now[0]))
+            now[0] = end_time
+        return client.get_metrics()
+
+
+def main():
+    minutes = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    metrics = run_benchmark(minutes)
+    rates = metrics["bytes_per_minute_by_mode"]
+    print(f"模拟时长：每种模式 {minutes} 分钟")
+    for mode in ("high", "low"):
+        print(f"  {mode:<5} {rates[mode]:>10.1f} 字节/分钟  共 {metrics['rx_bytes_by_mode'][mode]} 字节")
+    print(f"低频批量模式流量为高频模式的 {rates['low'] / rates['high']:.2%}，节省 {1 - rates['low'] / rates['high']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# 速率协商测试和流量基准共用的假对象：不连Broker、不跑Kivy主循环
+import json
+
+from esp32_mqtt_utils import RATE_ACK_TOPIC
+
+
+class FakeEvent:
+    def __init__(self, clock, callback, timeout):
+        self.clock = clock
+        self.callback = callback
+        self.timeout = timeout
+
+    def cancel(self):
+        if self in self.clock.pending:
+            self.clock.pending.remove(self)
+
+
+class FakeClock:
+    """替代kivy.clock.Clock：延时0的回调立即执行（相当于已回到主线程），其余留待手动触发"""
+
+    def __init__(self):
+        self.pending = []
+
+    def schedule_once(self, callback, timeout=0):
+        event = FakeEvent(self, callback, timeout)
+        if timeout == 0:
+            callback(0)
+        else:
+            self.pending.append(event)
+        return event
+
+    def fire_pending(self):
+        events, self.pending = self.pending, []
+        for event in events:
+            event.callback(event.timeout)
+        return len(events)
+
+
+class FakeMqttClient:
+    """替代paho客户端，只记录发布的消息"""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append({"topic": topic, "payload": payload, "qos": qos, "retain": retain})
+
+    def subscribe(self, topic):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+
+
+def receive(client, topic, payload):
+    """模拟收到一条消息，返回消息字节数"""
+    message = FakeMessage(topic, payload)
+    client._on_message(None, None, message)
+    return len(message.payload)
+
+
+def send_ack(client, mode, seq=None):
+    ack = {"mode": mode} if seq is None else {"mode": mode, "seq": seq}
+    return receive(client, RATE_ACK_TOPIC, json.dumps(ack))
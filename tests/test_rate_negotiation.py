@@ -0,0 +1,141 @@
+import json
+
+import pytest
+
+pytest.importorskip("paho.mqtt.client")
+pytest.importorskip("kivy.clock")
+
+import esp32_mqtt_utils
+from esp32_mqtt_utils import RATE_CONTROL_TOPIC, RATE_MAX_RETRIES, Esp32MqttClient
+from mqtt_fakes import FakeClock, FakeMqttClient, receive, send_ack
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(esp32_mqtt_utils.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(esp32_mqtt_utils, "Clock", fake_clock)
+    return fake_clock
+
+
+@pytest.fixture
+def client(clock, fake_time):
+    mqtt_client = Esp32MqttClient("broker", 8883, "user", "password")
+    mqtt_client.mqtt_client = FakeMqttClient()
+    mqtt_client.connected = True
+    return mqtt_client
+
+
+def rate_commands(client):
+    return [json.loads(p["payload"]) for p in client.mqtt_client.published if p["topic"] == RATE_CONTROL_TOPIC]
+
+
+def test_rate_command_is_retained_with_mode_settings(client):
+    assert client.set_rate_mode("low")
+    published = client.mqtt_client.published[-1]
+    assert published["retain"] and published["qos"] == 1
+    assert rate_commands(client) == [{"interval_ms": 60000, "batch": 10, "mode": "low", "seq": 1}]
+
+
+def test_ack_with_stale_seq_is_ignored(client):
+    client.set_rate_mode("high")
+    client.set_rate_mode("low")
+
+    send_ack(client, "high", seq=1)
+    assert client.rate_mode_acked is None
+
+    send_ack(client, "low", seq=2)
+    assert client.rate_mode_acked == "low"
+    assert client.rate_seq_acked == 2
+
+
+def test_ack_without_seq_is_matched_by_mode(client):
+    client.set_rate_mode("low")
+
+    send_ack(client, "high")
+    assert client.rate_mode_acked is None
+
+    send_ack(client, "low")
+    assert client.rate_mode_acked == "low"
+
+
+def test_unacked_command_is_resent_until_retry_limit(client, clock):
+    client.set_rate_mode("low")
+    while clock.fire_pending():
+        pass
+
+    commands = rate_commands(client)
+    assert len(commands) == 1 + RATE_MAX_RETRIES
+    assert [c["seq"] for c in commands] == list(range(1, RATE_MAX_RETRIES + 2))
+
+
+def test_resend_stops_once_acked(client, clock):
+    client.set_rate_mode("low")
+    send_ack(client, "low", seq=1)
+    clock.fire_pending()
+    assert len(rate_commands(client)) == 1
+
+
+def test_set_rate_mode_does_not_skip_unacked_request(client):
+    client.set_rate_mode("low")
+    client.set_rate_mode("low")
+    assert len(rate_commands(client)) == 2
+
+    send_ack(client, "low", seq=2)
+    client.set_rate_mode("low")
+    assert len(rate_commands(client)) == 2
+
+
+def test_reconnect_resends_requested_mode(client):
+    client.set_rate_mode("high")
+    send_ack(client, "high", seq=1)
+
+    client._on_connect(None, None, None, 0)
+    assert rate_commands(client)[-1] == {"interval_ms": 1000, "batch": 1, "mode": "high", "seq": 2}
+
+
+def test_expected_report_interval_follows_slowest_pending_mode(client):
+    assert client.expected_report_interval() == 0
+    client.set_rate_mode("low")
+    assert client.expected_report_interval() == 600
+    send_ack(client, "low", seq=1)
+    client.set_rate_mode("high")
+    # 切回高频未确认前，设备可能仍按低频上报
+    assert client.expected_report_interval() == 600
+    send_ack(client, "high", seq=2)
+    assert client.expected_report_interval() == 1
+
+
+def test_bytes_per_minute_is_split_by_acked_mode(client, fake_time):
+    client.set_rate_mode("high")
+    send_ack(client, "high", seq=1)   # 时长为0，归入unknown后不参与速率计算
+
+    high_bytes = 0
+    for _ in range(60):
+        fake_time[0] += 1
+        high_bytes += receive(client, "esp32/data", "x" * 100)
+
+    client.set_rate_mode("low")
+    high_bytes += send_ack(client, "low", seq=2)  # ACK到达时仍处于高频模式
+    fake_time[0] += 600
+    low_bytes = receive(client, "esp32/data", "y" * 1000)
+
+    metrics = client.get_metrics()
+    assert metrics["rx_bytes_by_mode"]["high"] == high_bytes
+    assert metrics["rx_bytes_by_mode"]["low"] == low_bytes
+    assert metrics["seconds_by_mode"] == {"unknown": 0, "high": 60, "low": 600}
+    assert metrics["bytes_per_minute_by_mode"] == {"high": round(high_bytes, 1), "low": 100.0}
+    assert metrics["rate_mode_acked"] == "low"
+
+
+def test_benchmark_low_mode_saves_bandwidth():
+    from bench_rate_modes import run_benchmark
+
+    rates = run_benchmark(minutes=30)["bytes_per_minute_by_mode"]
+    assert rates["low"] < rates["high"] / 10
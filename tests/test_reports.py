@@ -0,0 +1,96 @@
+import datetime
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import reports
+from history_store import HistoryStore
+
+DAY = datetime.date(2026, 10, 1)
+
+
+def minute_ts(minute, day=DAY):
+    return time.mktime(day.timetuple()) + minute * 60
+
+
+def test_same_minute_records_are_merged_by_weight(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.add_reading({"do": 6.0}, ts=minute_ts(10))
+    store.add_reading({"do": 6.0, "ph": 7.0}, ts=minute_ts(10) + 1)
+    store.flush()  # 模拟切后台时提前落盘
+    store.add_reading({"do": 9.0}, ts=minute_ts(10) + 30)
+    store.add_reading({"do": 1.0}, ts=minute_ts(11))
+    store.flush()
+
+    records, _ = reports.load_day_records(str(tmp_path), DAY)
+
+    assert list(records["minute"]) == [10, 11]
+    assert list(records["weight"]) == [3, 1]
+    assert records["do"][0] == pytest.approx(7.0)
+    assert records["ph"][0] == pytest.approx(7.0)
+
+
+def test_do_below_min_uses_threshold_active_at_sample_time(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    for minute in range(4):
+        store.add_reading({"do": 5.5, "ph": 9.5, "temp": 20 + minute}, ts=minute_ts(minute))
+    store.flush()
+    # 第0分钟尚无阈值，第1分钟起下限6.0，第3分钟起下限5.0
+    thresholds = [[minute_ts(1), 6.0, 8.0], [minute_ts(3), 5.0, 8.0]]
+
+    records, _ = reports.load_day_records(str(tmp_path), DAY)
+    summary = reports.compute_day_summary(records, DAY, thresholds)
+
+    assert summary["samples"] == 4
+    assert summary["threshold_minutes"] == 3
+    assert summary["do_below_min_minutes"] == 2
+    assert summary["ph_out_of_range_hours"] == round(4 / 60, 1)
+    assert summary["temp_range"] == 3.0
+    assert summary["do_hourly"][0] == 5.5
+    assert summary["do_hourly"][1] is None
+
+
+def test_day_is_recomputed_only_when_its_file_grows(tmp_path, monkeypatch):
+    history_dir, cache_dir = str(tmp_path / "history"), str(tmp_path / "reports")
+    store = HistoryStore(history_dir)
+    yesterday = DAY - datetime.timedelta(days=1)
+    store.add_reading({"do": 7.0}, ts=minute_ts(0, yesterday))
+    store.add_reading({"do": 7.0}, ts=minute_ts(0))
+    store.flush()
+
+    computed_days = []
+    compute = reports.compute_day_summary
+
+    def counting_compute(records, day, thresholds):
+        computed_days.append(day)
+        return compute(records, day, thresholds)
+
+    monkeypatch.setattr(reports, "compute_day_summary", counting_compute)
+
+    first = reports.build_report(history_dir, cache_dir, 2, today=DAY)
+    assert computed_days == [DAY, yesterday]
+
+    computed_days.clear()
+    assert reports.build_report(history_dir, cache_dir, 2, today=DAY) == first
+    assert computed_days == []
+
+    store.add_reading({"do": 8.0}, ts=minute_ts(1))
+    store.flush()
+    computed_days.clear()
+    summaries = reports.build_report(history_dir, cache_dir, 2, today=DAY)
+    assert computed_days == [DAY]
+    assert summaries[0]["samples"] == 2
+
+
+def test_malformed_threshold_rows_are_skipped(tmp_path):
+    thresholds_path = tmp_path / "thresholds.json"
+    thresholds_path.write_text('{"a": 1}', encoding="utf-8")
+    assert HistoryStore(str(tmp_path)).load_thresholds() == []
+
+    thresholds_path.write_text('[[200, 6.0, 8.0], [1, 2], ["x", 1, 2], [100, 5.0, true], 7, [100, 5.0, 9.0]]',
+                               encoding="utf-8")
+    thresholds = HistoryStore(str(tmp_path)).load_thresholds()
+    assert thresholds == [[100, 5.0, 9.0], [200, 6.0, 8.0]]
+    assert reports.build_report(str(tmp_path), str(tmp_path / "reports"), 1, today=DAY)[0]["samples"] == 0
@@ -0,0 +1,87 @@
+import time
+
+from state_cache import DEFAULT_DEVICE_ID, LastStateCache, resolve_sample_ts
+
+
+def make_cache(tmp_path):
+    return LastStateCache(str(tmp_path / "last_state.json"), save_interval=0)
+
+
+def test_newer_shadow_field_wins(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set_field(DEFAULT_DEVICE_ID, "do", 7.0, ts=100)
+    cache.set_field(DEFAULT_DEVICE_ID, "switch", "no", ts=300)
+
+    updated = cache.reconcile_shadow({"ts": 200, "do": "6.5", "switch": "yes"})
+
+    assert updated == ["do"]
+    assert cache.get_field(DEFAULT_DEVICE_ID, "do") == (6.5, 200)
+    assert cache.get_field(DEFAULT_DEVICE_ID, "switch") == ("no", 300)
+
+
+def test_shadow_without_valid_ts_is_ignored(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.reconcile_shadow({"do": 7.1}) == []
+    assert cache.reconcile_shadow({"ts": "bad", "do": 7.1}) == []
+    assert cache.reconcile_shadow({"ts": 0, "do": 7.1}) == []
+    assert cache.get_field(DEFAULT_DEVICE_ID, "do") == (None, None)
+
+
+def test_shadow_skips_non_numeric_readings(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.reconcile_shadow({"ts": 100, "ph": "abc", "temp": 25}) == ["temp"]
+    assert cache.get_field(DEFAULT_DEVICE_ID, "ph") == (None, None)
+
+
+def test_flush_and_load_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    now = time.time()
+    cache.update_readings(None, {"do": "7.25", "ph": 7, "temp": None}, ts=now)
+    assert cache.flush_if_due()
+
+    loaded = LastStateCache(cache.path).load()
+    assert loaded.get_field(DEFAULT_DEVICE_ID, "do") == (7.25, now)
+    assert loaded.get_field(DEFAULT_DEVICE_ID, "temp") == (None, None)
+    assert loaded.is_online(now=now)
+    assert not loaded.is_online(now=now + 3600)
+
+
+def test_load_ignores_non_object_json(tmp_path):
+    path = tmp_path / "last_state.json"
+    path.write_text("[1, 2]", encoding="utf-8")
+    assert LastStateCache(str(path)).load().devices == {}
+
+
+def test_status_without_last_seen_does_not_mark_device_online(tmp_path):
+    cache = make_cache(tmp_path)
+    now = time.time()
+    cache.update_readings(None, {"do": 7.0}, ts=now - 3 * 3600)
+    cache.set_field(DEFAULT_DEVICE_ID, "status", "online", ts=now, touch_last_seen=False)
+
+    assert cache.last_seen() == now - 3 * 3600
+    assert not cache.is_online(now=now)
+
+
+def test_online_timeout_extends_with_report_interval(tmp_path):
+    cache = make_cache(tmp_path)
+    now = time.time()
+    cache.update_readings(None, {"do": 7.0}, ts=now - 500)
+
+    assert not cache.is_online(now=now)
+    # 低频批量模式：10条 × 60秒才上报一次
+    assert cache.is_online(now=now, report_interval=600)
+    assert not cache.is_online(now=now + 300, report_interval=600)
+
+
+def test_resolve_sample_ts_rejects_unsynced_device_clock():
+    now = 1_800_000_000.0
+    assert resolve_sample_ts(now - 30, now) == now - 30
+    assert resolve_sample_ts(now + 60, now) == now
+    # 未对时：0、开机秒数、无法解析
+    assert resolve_sample_ts(0, now) == now
+    assert resolve_sample_ts(5, now) == now
+    assert resolve_sample_ts(None, now) == now
+    assert resolve_sample_ts("nan", now) == now
+    # 低频批量模式下，批内最早的样本可能是十分钟前采集的
+    assert resolve_sample_ts(now - 590, now) == now
+    assert resolve_sample_ts(now - 590, now, report_interval=600) == now - 590